@@ -6,6 +6,10 @@ from extendedjsonschema.utils import JSON
 class Keyword:
     name: str = None
     type: Union[str, Tuple[str, ...]] = None
+    # set by the compiler before compile(): the caller only needs validity
+    # (a oneOf/anyOf/not branch), so keywords that compile subschemas may
+    # stop at the first failure instead of collecting every error
+    fail_fast: bool = False
 
     def __init__(self, value: JSON, schema: "Schema", path: List[Union[str, int]], rules: Dict[str, "Keyword"]):
         self._value = value
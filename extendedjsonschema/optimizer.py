@@ -1,118 +1,246 @@
 import ast
 
-from collections import defaultdict
+from collections import Counter
+from functools import lru_cache
 from typing import List, Union
 
 from extendedjsonschema.errors import OptimizerError
 
+# Context and operator nodes carry no per-occurrence state, so single
+# instances can be shared between every node the optimizer builds.
+_LOAD = ast.Load()
+_STORE = ast.Store()
+_NOT = ast.Not()
+_IS = ast.Is()
+
+
+def _fingerprint(node: ast.AST) -> tuple:
+    # A hashable structural key for the small expressions that appear as
+    # type() arguments (names, constants, subscripts), cheaper than
+    # round-tripping the subtree through ast.unparse.
+    node_class = node.__class__
+    if node_class is ast.Name:
+        return "name", node.id
+    elif node_class is ast.Constant:
+        return "const", node.value
+    elif node_class is ast.Subscript:
+        return "sub", _fingerprint(node.value), _fingerprint(node.slice)
+    elif node_class is ast.Attribute:
+        return "attr", _fingerprint(node.value), node.attr
+    else:
+        return "src", ast.unparse(node)
+
+
+def _is_type_calling_if(node: ast.AST) -> bool:
+    return node.__class__ is ast.If and \
+        node.test.__class__ is ast.Compare and \
+        node.test.left.__class__ is ast.Call and \
+        node.test.left.func.__class__ is ast.Name and \
+        node.test.left.func.id == "type"
+
+
+class _TypeCallingCollector(ast.NodeVisitor):
+    """Collects every `if type(x) == T` node in one walk, fingerprinting
+    each argument subtree exactly once and counting occurrences as it goes."""
 
-class Optimizer:
     def __init__(self):
-        self._type_callings = defaultdict(int)
-        self._additional_code = {}
-
-    def _count_type_calling(self, ast_obj: Union[ast.AST, List[ast.AST]]):
-        if type(ast_obj) == ast.If and \
-                type(ast_obj.test) == ast.Compare and \
-                type(ast_obj.test.left) == ast.Call and \
-                type(ast_obj.test.left.func) == ast.Name and \
-                ast_obj.test.left.func.id == "type":
-            self._type_callings[ast.unparse(ast_obj.test.left.args[0])] += 1
-            for _ast_obj in ast_obj.body:
-                self._count_type_calling(_ast_obj)
-            for _ast_obj in ast_obj.orelse:
-                self._count_type_calling(_ast_obj)
-        elif type(ast_obj) == list:
-            for i, _ast_obj in enumerate(ast_obj):
-                self._count_type_calling(_ast_obj)
-        elif isinstance(ast_obj, ast.AST):
-            for field in ast_obj._fields or []:
-                self._count_type_calling(getattr(ast_obj, field))
-
-    def __replace_type_calling(self, ast_obj: ast.AST) -> Union[ast.AST, None]:
-        additional_code = None
-        argument = ast.unparse(ast_obj.test.left.args[0])
+        self.matches: List[tuple] = []
+
+    @property
+    def type_callings(self) -> Counter:
+        return Counter(argument for _, argument in self.matches)
+
+    def visit_If(self, node: ast.If):
+        if _is_type_calling_if(node):
+            argument = _fingerprint(node.test.left.args[0])
+            self.matches.append((node, argument))
+            for child in node.body:
+                self.visit(child)
+            for child in node.orelse:
+                self.visit(child)
+        else:
+            self.generic_visit(node)
+
+
+class _TypeCallingReplacer:
+    def __init__(self, type_callings: dict, bound_variables: dict):
+        self._type_callings = type_callings
+        self._bound_variables = bound_variables
+
+    def replace(self, node: ast.If, argument: tuple):
         if self._type_callings[argument] == 1:
             isinstance_call = ast.Call(
-                func=ast.Name(id="isinstance", ctx=ast.Load()),
+                func=ast.Name(id="isinstance", ctx=_LOAD),
                 args=[
-                    ast_obj.test.left.args[0],
-                    ast_obj.test.comparators[0]
+                    node.test.left.args[0],
+                    node.test.comparators[0]
                 ],
                 keywords=[]
             )
-            if type(ast_obj.test.ops[0]) in (ast.NotEq, ast.NotIn):
-                ast_obj.test = ast.UnaryOp(op=ast.Not(), operand=isinstance_call)
+            if node.test.ops[0].__class__ in (ast.NotEq, ast.NotIn):
+                node.test = ast.UnaryOp(op=_NOT, operand=isinstance_call)
             else:
-                ast_obj.test = isinstance_call
+                node.test = isinstance_call
         elif self._type_callings[argument] > 1:
-            argument = argument.replace('"', "").replace("'", "").replace("[", "").replace("]", "")
-            if not self._additional_code.get(argument):
-                additional_code = ast.Assign(
-                    targets=[ast.Name(id=f"type_{argument}", ctx=ast.Store())],
-                    value=ast_obj.test.left,
-                    lineno=0
+            name = self._bound_variables.get(argument)
+            if name is None:
+                name = f"type_{len(self._bound_variables)}"
+                self._bound_variables[argument] = name
+                # bind the type at its first, earliest-executing occurrence
+                node.test.left = ast.NamedExpr(
+                    target=ast.Name(id=name, ctx=_STORE),
+                    value=node.test.left
                 )
-                self._additional_code[argument] = True
-            ast_obj.test.left = ast.Name(id=f"type_{argument}", ctx=ast.Load())
-        return additional_code
-
-    def _replace_type_calling(self, ast_obj: Union[ast.AST, List[ast.AST]]):
-        if type(ast_obj) == list:
-            i = 0
-            while i < len(ast_obj):
-                if type(ast_obj[i]) == ast.If and \
-                        type(ast_obj[i].test) == ast.Compare and \
-                        type(ast_obj[i].test.left) == ast.Call and \
-                        type(ast_obj[i].test.left.func) == ast.Name and \
-                        ast_obj[i].test.left.func.id == "type":
-                    additional_code = self.__replace_type_calling(ast_obj[i])
-                    if additional_code:
-                        ast_obj.insert(i, additional_code)
-                        i += 1
-                    for _ast_obj in ast_obj[i].body:
-                        self._replace_type_calling(_ast_obj)
-                    for _ast_obj in ast_obj[i].orelse:
-                        self._replace_type_calling(_ast_obj)
-                self._replace_type_calling(ast_obj[i])
-                i += 1
-        elif isinstance(ast_obj, ast.AST):
-            for field in ast_obj._fields or []:
-                self._replace_type_calling(getattr(ast_obj, field))
+            else:
+                node.test.left = ast.Name(id=name, ctx=_LOAD)
 
-    def _type_calling(self, ast_function: ast.FunctionDef):
-        self._count_type_calling(ast_function.body)
-        self._replace_type_calling(ast_function.body)
-
-    def _count_error_appending(self, ast_obj: Union[ast.AST, List[ast.AST]], parent_is_loop: bool) -> int:
-        result = 0
-        if type(ast_obj) == ast.Call and ast.unparse(ast_obj.func) == "errors.append":
-            return 2 if parent_is_loop else 1
-        elif type(ast_obj) == list:
-            for i, _ast_obj in enumerate(ast_obj):
-                result += self._count_error_appending(_ast_obj, parent_is_loop)
-        elif isinstance(ast_obj, ast.AST):
-            for field in ast_obj._fields or []:
-                is_loop = parent_is_loop or field == "body" and isinstance(ast_obj, (ast.AsyncFor, ast.For, ast.While))
-                result += self._count_error_appending(getattr(ast_obj, field), is_loop)
+
+def _is_errors_append_call(node: ast.AST) -> bool:
+    return node.__class__ is ast.Call and \
+        node.func.__class__ is ast.Attribute and \
+        node.func.attr == "append" and \
+        node.func.value.__class__ is ast.Name and \
+        node.func.value.id == "errors"
+
+
+class _ErrorAppendingCounter(ast.NodeVisitor):
+    def __init__(self):
+        self.count = 0
+        self._in_loop = False
+
+    def visit_Call(self, node: ast.Call):
+        if _is_errors_append_call(node):
+            self.count += 2 if self._in_loop else 1
+        self.generic_visit(node)
+
+    def _visit_loop(self, node: Union[ast.AsyncFor, ast.For, ast.While]):
+        for field, value in ast.iter_fields(node):
+            in_loop = self._in_loop or field == "body"
+            children = value if value.__class__ is list else [value]
+            for child in children:
+                if isinstance(child, ast.AST):
+                    previous, self._in_loop = self._in_loop, in_loop
+                    self.visit(child)
+                    self._in_loop = previous
+
+    visit_AsyncFor = _visit_loop
+    visit_For = _visit_loop
+    visit_While = _visit_loop
+
+
+class _ErrorAppendingReplacer(ast.NodeTransformer):
+    def visit_Expr(self, node: ast.Expr) -> ast.AST:
+        self.generic_visit(node)
+        if _is_errors_append_call(node.value):
+            return ast.Return(value=ast.List(elts=[node.value.args[0]], ctx=_LOAD))
+        return node
+
+
+class _ErrorAppendingMerger(ast.NodeTransformer):
+    @staticmethod
+    def _is_append(node: ast.AST) -> bool:
+        return node.__class__ is ast.Expr and _is_errors_append_call(node.value)
+
+    def _merge(self, statements: List[ast.stmt]) -> List[ast.stmt]:
+        result = []
+        appends = []
+        for statement in statements + [None]:
+            if statement is not None and self._is_append(statement):
+                appends.append(statement)
+                continue
+            if len(appends) > 1:
+                result.append(ast.Expr(value=ast.Call(
+                    func=ast.Attribute(value=ast.Name(id="errors", ctx=_LOAD), attr="extend", ctx=_LOAD),
+                    args=[ast.List(elts=[a.value.args[0] for a in appends], ctx=_LOAD)],
+                    keywords=[]
+                )))
+            else:
+                result.extend(appends)
+            appends = []
+            if statement is not None:
+                result.append(statement)
         return result
 
-    def _replace_error_appending(self, ast_obj: Union[ast.AST, List[ast.AST]]) -> Union[ast.AST, List[ast.AST]]:
-        if type(ast_obj) == ast.Call and ast.unparse(ast_obj.func) == "errors.append":
-            return ast.Return(value=ast.List(elts=[ast_obj.args[0]], ctx=ast.Load()))
-        elif type(ast_obj) == list:
-            for i, _ast_obj in enumerate(ast_obj):
-                ast_obj[i] = self._replace_error_appending(_ast_obj)
-        elif isinstance(ast_obj, ast.AST):
-            for field in ast_obj._fields or []:
-                setattr(ast_obj, field, self._replace_error_appending(getattr(ast_obj, field)))
-        return ast_obj
-
-    def _error_handling(self, ast_function: ast.FunctionDef):
-        if self._count_error_appending(ast_function.body, False) == 1:
+    def generic_visit(self, node: ast.AST) -> ast.AST:
+        super().generic_visit(node)
+        for field in ("body", "orelse", "finalbody"):
+            statements = getattr(node, field, None)
+            if statements.__class__ is list and len(statements) > 1:
+                setattr(node, field, self._merge(statements))
+        return node
+
+
+class _LazyErrorList(ast.NodeTransformer):
+    """Materializes the errors list at the first error site instead of
+    allocating an empty list up front, so clean runs — the common case —
+    allocate nothing and return None (falsy, same contract as the
+    single-append rewrite)."""
+
+    @staticmethod
+    def _errors_call(node: ast.AST) -> Union[ast.Call, None]:
+        call = node.value
+        if call.__class__ is ast.Call and \
+                call.func.__class__ is ast.Attribute and \
+                call.func.attr in {"append", "extend"} and \
+                call.func.value.__class__ is ast.Name and \
+                call.func.value.id == "errors":
+            return call
+        return None
+
+    def visit_Expr(self, node: ast.Expr) -> ast.AST:
+        call = self._errors_call(node)
+        if call is None:
+            return node
+        argument = call.args[0]
+        if call.func.attr == "append":
+            first = ast.List(elts=[argument], ctx=_LOAD)
+        elif argument.__class__ is ast.List:
+            first = argument
+        else:
+            first = ast.Call(func=ast.Name(id="list", ctx=_LOAD), args=[argument], keywords=[])
+        return ast.If(
+            test=ast.Compare(
+                left=ast.Name(id="errors", ctx=_LOAD),
+                ops=[_IS],
+                comparators=[ast.Constant(value=None)]
+            ),
+            body=[ast.Assign(targets=[ast.Name(id="errors", ctx=_STORE)], value=first)],
+            orelse=[node]
+        )
+
+
+class Optimizer:
+    def __init__(self):
+        self._type_callings = Counter()
+        self._bound_variables = {}
+
+    def _type_calling(self, ast_function: ast.FunctionDef):
+        collector = _TypeCallingCollector()
+        collector.visit(ast_function)
+        self._type_callings = collector.type_callings
+        replacer = _TypeCallingReplacer(self._type_callings, self._bound_variables)
+        for node, argument in collector.matches:
+            replacer.replace(node, argument)
+
+    def _error_handling(self, ast_function: ast.FunctionDef) -> int:
+        counter = _ErrorAppendingCounter()
+        counter.visit(ast_function)
+        if counter.count == 1:
             ast_function.body.pop(0)
             ast_function.body.pop(-1)
-            ast_function.body = self._replace_error_appending(ast_function.body)
+            _ErrorAppendingReplacer().visit(ast_function)
+        return counter.count
+
+    @staticmethod
+    def _lazy_errors(ast_function: ast.FunctionDef):
+        init = ast_function.body[0]
+        if init.__class__ is ast.Assign and \
+                init.targets[0].__class__ is ast.Name and \
+                init.targets[0].id == "errors" and \
+                init.value.__class__ is ast.List and \
+                not init.value.elts:
+            init.value = ast.Constant(value=None)
+            _LazyErrorList().visit(ast_function)
 
     def _to_ast(self, code) -> ast.FunctionDef:
         ast_module: ast.Module = ast.parse(code)
@@ -120,13 +248,28 @@ class Optimizer:
         if len(ast_module.body) == 0:
             raise OptimizerError("Got empty module")
 
-        if type(ast_module.body[0]) != ast.FunctionDef:
+        if ast_module.body[0].__class__ is not ast.FunctionDef:
             raise OptimizerError(f"Got '{ast_module.body[0].__class__.__name__}' instead of 'FunctionDef'")
 
         return ast_module.body[0]
 
-    def run(self, code: str) -> str:
-        ast_function = self._to_ast(code)
+    def run_function(self, ast_function: ast.FunctionDef) -> ast.FunctionDef:
         self._type_calling(ast_function)
-        self._error_handling(ast_function)
-        return ast.unparse(ast_function)
+        count = self._error_handling(ast_function)
+        _ErrorAppendingMerger().visit(ast_function)
+        if count > 1:
+            self._lazy_errors(ast_function)
+        return ast_function
+
+    def run(self, code: str) -> str:
+        return _run_cached(code)
+
+
+@lru_cache(maxsize=1024)
+def _run_cached(code: str) -> str:
+    # The optimizer is deterministic and keyed on the exact source text,
+    # so identical programs skip the parse/transform/unparse entirely.
+    # The AST path (Program.compile_ast) is covered by the module cache
+    # in Validator instead.
+    optimizer = Optimizer()
+    return ast.unparse(optimizer.run_function(optimizer._to_ast(code)))
@@ -1,3 +1,4 @@
+import ast
 import string
 from typing import Dict, List, Union
 
@@ -5,8 +6,36 @@ from extendedjsonschema.keyword import Keyword
 from extendedjsonschema.optimizer import Optimizer
 from extendedjsonschema.tools import add_indent, to_python_code
 
+_TEMPLATES: Dict[str, tuple] = {}
+_BRACE_ESCAPE = str.maketrans({"{": "{{", "}": "}}"})
+
+
+def _template(code: str) -> tuple:
+    """Split a keyword template once into (literal, field) fragments and the
+    set of field names, so rendering is a loop over fragments instead of a
+    fresh str.format parse per compile."""
+    template = _TEMPLATES.get(code)
+    if template is None:
+        fragments = [(v[0], v[1]) for v in string.Formatter().parse(code)]
+        variables = frozenset(name for _, name in fragments if name)
+        template = (fragments, variables)
+        _TEMPLATES[code] = template
+    return template
+
+
+def _render(fragments: List[tuple], values: Dict[str, str]) -> str:
+    result = []
+    for literal, name in fragments:
+        if literal:
+            result.append(literal)
+        if name:
+            result.append(values[name])
+    return "".join(result)
+
 
 class Program:
+    __slots__ = ("_schema", "field", "_general", "_type_specific")
+
     def __init__(self,
         schema: "Schema",
         general: List[Keyword] = None,
@@ -21,26 +50,36 @@ class Program:
     def __bool__(self) -> bool:
         return bool(self._general) or bool(self._type_specific)
 
-    def _compile_keywords(self, keywords: List[Keyword], data: str, error: Union[str, None]) -> List[str]:
+    @staticmethod
+    def _collect(keywords: List[Keyword], fail_fast: bool = False) -> List[tuple]:
+        # compile() is stateful and must run exactly once per keyword, so
+        # templates are gathered up front; rendering happens after the data
+        # expression (possibly a hoisted local) is settled
         result = []
         for keyword in keywords:
+            keyword.fail_fast = fail_fast
             code = keyword.compile()
             if code:
-                variables = {v[1] for v in string.Formatter().parse(code) if v[1]}
-                errors = {}
-                if not error:
-                    if self._schema.data_variable.path_has_variables:
-                        for variable, item in keyword.errors(self._schema.data_variable.path).items():
-                            errors[variable] = f"errors.append({to_python_code(item)})"
-                    else:
-                        self._schema.state.set_errors(keyword, keyword.errors(self._schema.data_variable.path))
+                result.append((keyword, _template(code)))
+        return result
+
+    def _render_keywords(self, collected: List[tuple], data: str, error: Union[str, None]) -> List[str]:
+        result = []
+        for keyword, (fragments, variables) in collected:
+            errors = {}
+            if not error:
+                if self._schema.data_variable.path_has_variables:
+                    for variable, item in keyword.errors(self._schema.data_variable.path).items():
+                        errors[variable] = f"errors.append({to_python_code(item)})"
                 else:
-                    errors = {"error": error}
-                format_data = {"data": data, **errors, **self._schema.state.variables(keyword, variables)}
-                code = code.format(**format_data).strip()
-                result.append(f"# {keyword.name}")
-                result.append(code.replace("{", "{{").replace("}", "}}"))
-                result.append("")
+                    self._schema.state.set_errors(keyword, keyword.errors(self._schema.data_variable.path))
+            else:
+                errors = dict.fromkeys(keyword.errors(self._schema.data_variable.path), error)
+            format_data = {"data": data, **errors, **self._schema.state.variables(keyword, variables)}
+            code = _render(fragments, format_data).strip()
+            result.append(f"# {keyword.name}")
+            result.append(code.translate(_BRACE_ESCAPE))
+            result.append("")
         return result[0:-1]
 
     def _body(self, **kwargs) -> str:
@@ -50,14 +89,36 @@ class Program:
         error = kwargs.get("error")
         data = self._schema.data_variable.push(kwargs.get("data"), kwargs.get("data_path"))
 
-        result = self._compile_keywords(self._general, data=data, error=error)
+        fail_fast = bool(error)
+        general = self._collect(self._general, fail_fast)
+        type_specific = [(t, self._collect(keywords, fail_fast)) for t, keywords in self._type_specific.items()]
+
+        # When the data expression is a subscript chain used more than once,
+        # evaluate it into a local first instead of re-indexing per check
+        prologue = None
+        if "[" in data:
+            uses = sum(1 for _, block in type_specific if block)
+            for _, (fragments, _) in general + [item for _, block in type_specific for item in block]:
+                uses += sum(1 for _, name in fragments if name == "data")
+            if uses > 1:
+                local = self._schema.data_variable.hoist_name()
+                prologue = f"{local} = {data}".translate(_BRACE_ESCAPE)
+                data = local
+
+        result = self._render_keywords(general, data=data, error=error)
 
         type_specific_result = []
         if_stmt = "if"
-        for t, keywords in self._type_specific.items():
-            block = self._compile_keywords(keywords, data=data, error=error)
+        for t, collected in type_specific:
+            block = self._render_keywords(collected, data=data, error=error)
             if block:
-                type_specific_result.append(f"{if_stmt} type({data}) == {t.__name__}:")
+                if t is int:
+                    # bool subclasses int: draft-04 numeric keywords must not
+                    # see booleans, same guard Type.compile emits
+                    condition = f"type({data}) is not bool and isinstance({data}, int)"
+                else:
+                    condition = f"isinstance({data}, {t.__name__})"
+                type_specific_result.append(f"{if_stmt} {condition}:")
                 type_specific_result.append(add_indent("\n".join(block)))
                 if_stmt = "elif"
 
@@ -68,26 +129,35 @@ class Program:
                 result.append("")
             result.extend(type_specific_result)
 
+        if result and prologue:
+            result.insert(0, prologue)
+
         return "\n".join(result)
 
     def compile(self, body_only: bool = True, **kwargs) -> str:
-        fn_body = self._body(**kwargs)
         if body_only:
-            return fn_body
+            return self._body(**kwargs)
         else:
-            if fn_body:
-                fn_body = "\n".join([
-                    "def program(data):",
-                    "    errors = []",
-                    "",
-                    add_indent(fn_body.replace("{{", "{").replace("}}", "}")),
-                    "    return errors"
-                ])
-                optimizer = Optimizer()
-                return "\n\n\n".join(block for block in (
-                    self._schema.imports.compile_all(),
-                    self._schema.state.compile_all(),
-                    optimizer.run(fn_body)
-                ) if block)
-            else:
-                return "def program(data):\n    return []"
+            return ast.unparse(self.compile_ast(**kwargs))
+
+    def compile_ast(self, **kwargs) -> ast.Module:
+        fn_body = self._body(**kwargs)
+        if fn_body:
+            fn_code = "\n".join([
+                "def program(data):",
+                "    errors = []",
+                "",
+                add_indent(fn_body.replace("{{", "{").replace("}}", "}")),
+                "    return errors"
+            ])
+            source = "\n\n\n".join(block for block in (
+                self._schema.imports.compile_all(),
+                self._schema.state.compile_all(),
+                fn_code
+            ) if block)
+        else:
+            source = "def program(data):\n    return []"
+
+        module = ast.parse(source)
+        Optimizer().run_function(module.body[-1])
+        return ast.fix_missing_locations(module)
@@ -1,3 +1,4 @@
+import sys
 from collections import defaultdict
 from typing import Any, Dict, List, Set, Union
 
@@ -8,9 +9,12 @@ from extendedjsonschema.utils import JSON, PATH
 
 
 class Imports:
+    __slots__ = ("_packages", "_modules", "_compiled")
+
     def __init__(self):
         self._packages = set()
-        self._modules = defaultdict(set)
+        self._modules: Dict[str, List[str]] = {}
+        self._compiled = None
 
     def compile_packages(self) -> str:
         return "\n".join(f"import {package}" for package in sorted(self._packages))
@@ -18,58 +22,77 @@ class Imports:
     def compile_modules(self) -> str:
         result = []
         for package, modules in self._modules.items():
-            modules = ", ".join(sorted(modules))
+            modules = ", ".join(sorted(set(modules)))
             result.append(f"from {package} import {modules}")
         return "\n".join(result)
 
     def compile_all(self) -> str:
-        result = []
-        packages = self.compile_packages()
-        if packages:
-            result.append(packages)
-        modules = self.compile_modules()
-        if modules:
-            result.append(modules)
-        return "\n\n".join(result)
+        if self._compiled is None:
+            result = []
+            packages = self.compile_packages()
+            if packages:
+                result.append(packages)
+            modules = self.compile_modules()
+            if modules:
+                result.append(modules)
+            self._compiled = "\n\n".join(result)
+        return self._compiled
 
     def import_package(self, package: str):
         self._packages.add(package)
+        self._compiled = None
 
     def import_module(self, package: str, module: str):
-        self._modules[package].add(module)
+        self._modules.setdefault(package, []).append(module)
+        self._compiled = None
 
 
 class State:
+    __slots__ = ("_code", "_variables", "_errors", "_used_variables", "_keyword_ids")
+
     def __init__(self):
-        self._code = []
+        # dict used as an insertion-ordered set: O(1) dedup in add_code
+        self._code = {}
         self._variables = defaultdict(dict)
         self._errors = defaultdict(dict)
         self._used_variables = set()
+        self._keyword_ids = {}
+
+    def _keyword_id(self, keyword: "Keyword") -> int:
+        # Small sequential ids keep the generated k{id}_{name} identifiers
+        # short. The keyword object itself is the key: the strong reference
+        # pins it in memory, so a freed keyword's address can't hand its id
+        # to a newcomer the way a bare id() key could.
+        keyword_id = self._keyword_ids.get(keyword)
+        if keyword_id is None:
+            keyword_id = len(self._keyword_ids)
+            self._keyword_ids[keyword] = keyword_id
+        return keyword_id
 
     def add_code(self, code: str):
-        if code not in self._code:
-            self._code.append(code)
+        self._code[code] = None
 
     def set_variable(self, keyword: "Keyword", name: str, value: Any):
         if name.startswith("data") or name.startswith("error"):
             raise Error(f"The '{name}' variable is defined automatically. You can't define it manually")
-        self._variables[id(keyword)][name] = value
+        keyword_id = self._keyword_id(keyword)
+        self._variables[keyword_id][name] = (sys.intern(f"k{keyword_id}_{name}"), value)
 
     def set_errors(self, keyword: "Keyword", errors: Dict[str, dict]):
+        keyword_id = self._keyword_id(keyword)
+        keyword_errors = self._errors[keyword_id]
         for variable, error in errors.items():
-            self._errors[id(keyword)][variable] = error
+            keyword_errors[variable] = (sys.intern(f"k{keyword_id}_{variable}"), error)
 
     def variables(self, keyword: "Keyword", variables: Set[str]) -> Dict[str, str]:
-        keyword_id = id(keyword)
+        keyword_id = self._keyword_id(keyword)
         result = {}
-        for name in self._variables[keyword_id].keys():
+        for name, (var_name, _) in self._variables[keyword_id].items():
             if name in variables:
-                var_name = f"k{keyword_id}_{name}"
                 result[name] = var_name
                 self._used_variables.add(var_name)
-        for variable in self._errors.get(keyword_id, {}).keys():
+        for variable, (var_name, _) in self._errors.get(keyword_id, {}).items():
             if variable in variables:
-                var_name = f"k{keyword_id}_{variable}"
                 result[variable] = f"errors.append({var_name})"
                 self._used_variables.add(var_name)
         return result
@@ -78,21 +101,23 @@ class State:
         return "\n\n".join(self._code)
 
     def compile_variables(self) -> str:
+        render = to_python_code  # local binding for the tight loop
+        used = self._used_variables
         result = []
-        for keyword_id, variables in self._variables.items():
-            for name, value in variables.items():
-                var_name = f"k{keyword_id}_{name}"
-                if var_name in self._used_variables:
-                    result.append(f"{var_name} = {to_python_code(value)}")
+        for variables in self._variables.values():
+            for var_name, value in variables.values():
+                if var_name in used:
+                    result.append(f"{var_name} = {render(value)}")
         return "\n".join(result)
 
     def compile_errors(self) -> str:
+        render = to_python_code
+        used = self._used_variables
         result = []
-        for keyword_id, errors in self._errors.items():
-            for variable, error in errors.items():
-                var_name = f"k{keyword_id}_{variable}"
-                if var_name in self._used_variables:
-                    result.append(f"{var_name} = {to_python_code(error)}")
+        for errors in self._errors.values():
+            for var_name, error in errors.values():
+                if var_name in used:
+                    result.append(f"{var_name} = {render(error)}")
         return "\n".join(result)
 
     def compile_all(self) -> str:
@@ -110,40 +135,57 @@ class State:
 
 
 class DataVariable:
+    __slots__ = ("_data", "_path", "_truthy_path", "_variables_count", "_hoist_count")
+
     def __init__(self):
-        self._data: List[dict] = [{"name": "data", "path": []}]
+        self._data: List[dict] = [{"name": "data", "rendered": ""}]
         self._path: List[Union[DataIndex, None]] = []
+        self._truthy_path: List[DataIndex] = []
+        self._variables_count = 0
+        self._hoist_count = 0
+
+    def hoist_name(self) -> str:
+        self._hoist_count += 1
+        return f"data_v{self._hoist_count}"
 
     def push(self, name: Union[str, None], path: Union[DataIndex, None]) -> str:
         if path is not None and not isinstance(path, DataIndex):
             raise ValueError("The value of 'path' parameter must be an instance of subclass of 'DataIndex' class")
 
         self._path.append(path)
-
-        name = name or self._data[-1]["name"]
-        data_path = [path] if path is not None else []
-
-        if name != self._data[-1]["name"]:
-            new_data_path = []
+        if path is not None:
+            self._truthy_path.append(path)
+            if isinstance(path, Variable):
+                self._variables_count += 1
+
+        previous = self._data[-1]
+        name = name or previous["name"]
+
+        if name != previous["name"]:
+            rendered = ""
+        elif path is not None:
+            rendered = previous["rendered"] + f"[{to_python_code(path)}]"
         else:
-            new_data_path = self._data[-1]["path"][:] + data_path
-        self._data.append({"name": name, "path": new_data_path})
-        return name + "".join([f"[{to_python_code(s)}]" for s in self._data[-1]["path"]])
+            rendered = previous["rendered"]
+        self._data.append({"name": name, "rendered": rendered})
+        return name + rendered
 
     @property
     def path(self) -> List[DataIndex]:
-        return [item for item in self._path if item]
+        # copy: callers embed the path into error dicts rendered later
+        return self._truthy_path[:]
 
     @property
     def path_has_variables(self) -> bool:
-        for item in self._path:
-            if isinstance(item, Variable):
-                return True
-        return False
+        return self._variables_count > 0
 
     def pop(self):
         self._data.pop()
-        self._path.pop()
+        path = self._path.pop()
+        if path is not None:
+            self._truthy_path.pop()
+            if isinstance(path, Variable):
+                self._variables_count -= 1
 
 
 class Schema:
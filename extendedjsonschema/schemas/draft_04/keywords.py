@@ -1,10 +1,19 @@
 import logging
 import re
+import sys
+from functools import lru_cache
 from typing import List, Union
 
 from extendedjsonschema.errors import SchemaError
 from extendedjsonschema.keyword import Keyword
-from extendedjsonschema.tools import add_indent, non_unique_items, Const, Variable
+from extendedjsonschema.tools import add_indent, has_duplicates, non_unique_items, to_python_code, Const, Variable
+
+
+@lru_cache(maxsize=1024)
+def _compile_pattern(pattern: str) -> "re.Pattern":
+    # schema repositories repeat the same patterns across many nodes;
+    # validate() and compile() also both touch each pattern once
+    return re.compile(pattern)
 
 
 # General
@@ -29,39 +38,52 @@ class Type(Keyword):
         elif type(self.value) == list:
             if len(self.value) == 0:
                 raise SchemaError(self.path, "It must be an non-empty array of strings")
-            elif len(list(filter(lambda x: type(x) != str or len(x) == 0, self.value))) > 0:
+            elif any(type(x) is not str or not x for x in self.value):
                 raise SchemaError(self.path, "It must be an array, where each element is a non-empty string")
-            elif len(self.value) != len(set(self.value)):
+            elif has_duplicates(self.value):
                 raise SchemaError(self.path, "It must be an array of strings, where each element is unique")
             elif (set(self.value) & valid_types) != set(self.value):
                 raise SchemaError(self.path, f"Invalid types. Possible types: {', '.join(sorted(valid_types))}")
         else:
             raise SchemaError(self.path, "The value of this keyword must be either a string or an array of strings")
 
-    def code(self, t) -> str:
+    def code(self, t: type) -> str:
+        # bool is a subclass of int, so a bare isinstance would accept
+        # booleans as integers; guard the integer case explicitly
+        if t is int:
+            return f"""
+if type({{data}}) is bool or not isinstance({{data}}, int):
+    {{error}}
+"""
+        type_name = "NoneType" if t is type(None) else t.__name__
         return f"""
-if type({{data}}) != {t}:
+if not isinstance({{data}}, {type_name}):
     {{error}}
 """
 
-    def code_list(self) -> str:
+    def code_list(self, types: tuple) -> str:
+        self.set_variable("value", types)
+        if int in types and bool not in types:
+            return f"""
+if type({{data}}) is bool or not isinstance({{data}}, {{value}}):
+    {{error}}
+"""
         return f"""
-if type({{data}}) not in {{value}}:
+if not isinstance({{data}}, {{value}}):
     {{error}}
 """
 
     def compile(self) -> str:
         if self.value == "null" or (type(self.value) == list and "null" in self.value):
-            self.add_code("NoneType = type(None)")
+            self.import_module("extendedjsonschema.utils", "NoneType")
 
         if type(self.value) == str:
-            return self.code(self.valid_types[self.value].__name__)
+            return self.code(self.valid_types[self.value])
         else:
             if len(self.value) == 1:
-                return self.code(self.valid_types[self.value[0]].__name__)
+                return self.code(self.valid_types[self.value[0]])
             else:
-                self.set_variable("value", tuple((self.valid_types[t] for t in self.value)))
-                return self.code_list()
+                return self.code_list(tuple(self.valid_types[t] for t in self.value))
 
 
 class Enum(Keyword):
@@ -77,24 +99,103 @@ class Enum(Keyword):
         # TODO: check intersection of `type` and `enum` values
 
     def compile(self) -> str:
-        self.import_module("extendedjsonschema.tools", "is_equal")
-        if None in self.value:
-            self.add_code("NoneType = type(None)")
-        self.set_variable("value", [(type(item), item) for item in self.value])
-
-        enum_type = f"enum_type_{id(self)}"
-        enum_data = f"enum_data_{id(self)}"
-        return f"""
-type_data_{id(self)} = type({{data}})
-for {enum_type}, {enum_data} in {{value}}:
-    if is_equal(type_data_{id(self)}, {enum_type}, {{data}}, {enum_data}):
-        break
-else:
-    {{error}}
-"""
+        # A single variant needs no dispatch at all: one type-strict
+        # comparison replaces the partitioned membership tests.
+        if len(self.value) == 1:
+            item = self.value[0]
+            t = type(item)
+            if t is type(None):
+                return "if {data} is not None:\n" + add_indent("{error}")
+            elif t in {list, dict}:
+                self.import_module("extendedjsonschema.tools", "is_equal")
+                self.set_variable("value", item)
+                return f"if not is_equal(type({{data}}), {t.__name__}, {{data}}, {{value}}):\n" + add_indent("{error}")
+            else:
+                self.set_variable("value", item)
+                return f"if type({{data}}) is not {t.__name__} or {{data}} != {{value}}:\n" + add_indent("{error}")
+
+        # Partition variants by type at compile time: scalar variants of one
+        # type collapse into a set membership test, only list/dict variants
+        # still need the is_equal loop.
+        scalars = {}
+        containers = []
+        for item in self.value:
+            t = type(item)
+            if t in {list, dict}:
+                containers.append((t, item))
+            else:
+                scalars.setdefault(t, set()).add(item)
+
+        type_data = f"type_data_{id(self)}"
+        result = [f"{type_data} = type({{data}})"]
+        if_stmt = "if"
+        for t, values in scalars.items():
+            if t is type(None):
+                self.import_module("extendedjsonschema.utils", "NoneType")
+                result.append(f"{if_stmt} {type_data} is NoneType:")
+                result.append(add_indent("pass"))
+            else:
+                # inline the set display: CPython folds `not in {literals}`
+                # into a frozenset constant of the code object, so the test
+                # pays no global lookup and no per-call allocation
+                items = ", ".join(to_python_code(v) for v in sorted(values, key=repr))
+                result.append(f"{if_stmt} {type_data} is {t.__name__}:")
+                result.append(add_indent(f"if {{data}} not in {{{{{items}}}}}:"))
+                result.append(add_indent("{error}", 2))
+            if_stmt = "elif"
+
+        if containers:
+            self.import_module("extendedjsonschema.tools", "is_equal")
+            self.set_variable("value", containers)
+            enum_type = f"enum_type_{id(self)}"
+            enum_data = f"enum_data_{id(self)}"
+            result.append(f"{if_stmt} {type_data} is list or {type_data} is dict:")
+            result.append(add_indent(f"for {enum_type}, {enum_data} in {{value}}:"))
+            result.append(add_indent(f"if is_equal({type_data}, {enum_type}, {{data}}, {enum_data}):", 2))
+            result.append(add_indent("break", 3))
+            result.append(add_indent("else:"))
+            result.append(add_indent("{error}", 2))
+
+        result.append("else:")
+        result.append(add_indent("{error}"))
+        return "\n".join(result)
 
 
 # schema composition
+# rough per-keyword validation cost; anything unknown counts as 2
+_KEYWORD_COSTS = {
+    "type": 1, "enum": 1,
+    "minLength": 1, "maxLength": 1,
+    "minimum": 1, "maximum": 1, "multipleOf": 1,
+    "minItems": 1, "maxItems": 1, "minProperties": 1, "maxProperties": 1,
+    "required": 2,
+    "uniqueItems": 5,
+    "format": 8,
+    "pattern": 10
+}
+
+
+def _schema_cost(schema: dict) -> int:
+    if type(schema) != dict:
+        return 0
+    total = 0
+    for key, value in schema.items():
+        if key in {"allOf", "anyOf", "oneOf"} and type(value) == list:
+            total += 50 + sum(_schema_cost(item) for item in value)
+        elif key == "not":
+            total += 50 + _schema_cost(value)
+        elif key in {"properties", "patternProperties"} and type(value) == dict:
+            total += len(value) + sum(_schema_cost(item) for item in value.values())
+        elif key in {"items", "additionalProperties", "additionalItems"}:
+            if type(value) == list:
+                total += 5 + sum(_schema_cost(item) for item in value)
+            else:
+                total += 5 + _schema_cost(value)
+        else:
+            total += _KEYWORD_COSTS.get(key, 2)
+    return total
+
+
 class AllOf(Keyword):
     name = "allOf"
 
@@ -105,10 +206,44 @@ class AllOf(Keyword):
             if not self.schema.is_schema(item):
                 raise SchemaError(self.path + [i], "It must be a JSON Schema object")
 
+    def code_fail_fast(self, order: List[int]) -> str:
+        # The caller only needs validity, not per-child errors: compile the
+        # subschemas against a local flag and skip the rest after the first
+        # failure. This also routes child failures into the caller's flag —
+        # plain child code would append real errors from inside a branch.
+        ok = f"all_ok_{id(self)}"
+        programs = []
+        for i in order:
+            code = self.schema.program(self.value[i], self.path + [i]).compile(error=f"{ok} = False")
+            if code:
+                programs.append(code)
+            else:
+                logging.warning(f"Validation against subschema '{self.path + [i]}' is always true")
+        if not programs:
+            return ""
+
+        result = [f"{ok} = True", ""]
+        for i, code in enumerate(programs):
+            if i == 0:
+                result.append(code)
+            else:
+                result.append(f"if {ok}:")
+                result.append(add_indent(code))
+            result.append("")
+        result.append(f"if not {ok}:")
+        result.append(add_indent("{error}"))
+        return "\n".join(result)
+
     def compile(self) -> str:
+        # Cheap subschemas run first so likely rejects fire before expensive
+        # checks; allOf must run every branch anyway, so only the order of
+        # reported errors changes.
+        order = sorted(range(len(self.value)), key=lambda i: _schema_cost(self.value[i]))
+        if self.fail_fast:
+            return self.code_fail_fast(order)
         programs = []
-        for i, schema in enumerate(self.value):
-            code = self.schema.program(schema, self.path + [i]).compile()
+        for i in order:
+            code = self.schema.program(self.value[i], self.path + [i]).compile()
             if code:
                 programs.append(code)
             else:
@@ -128,8 +263,8 @@ class AnyOf(Keyword):
 
     def compile(self) -> str:
         programs = []
-        result = []
         has_errors = f"has_errors_{id(self)}"
+        any_ok = f"any_ok_{id(self)}"
 
         for i, schema in enumerate(self.value):
             code = self.schema.program(schema, self.path + [i]).compile(error=f"{has_errors} = True")
@@ -138,15 +273,25 @@ class AnyOf(Keyword):
                 return ""
             programs.append(code)
 
-        j = 0
+        # Flat chain of branches, each skipped once one has succeeded, instead
+        # of nesting every branch one level deeper than the previous one.
+        result = [f"{any_ok} = False", ""]
         for i, code in enumerate(programs):
-            result.append(add_indent(f"# {i}", j))
-            result.append(add_indent(f"{has_errors} = False", j))
-            result.append(add_indent(code, j))
-            result.append(add_indent(f"if {has_errors}:", j))
-            j += 1
-        if result:
-            result.append(add_indent("{error}", j))
+            branch = [
+                f"# {i}",
+                f"{has_errors} = False",
+                code,
+                f"if not {has_errors}:",
+                add_indent(f"{any_ok} = True")
+            ]
+            if i == 0:
+                result.extend(branch)
+            else:
+                result.append(f"if not {any_ok}:")
+                result.append(add_indent("\n".join(branch)))
+            result.append("")
+        result.append(f"if not {any_ok}:")
+        result.append(add_indent("{error}"))
 
         return "\n".join(result)
 
@@ -161,13 +306,71 @@ class OneOf(Keyword):
             if not self.schema.is_schema(item):
                 raise SchemaError(self.path + [i], "It must be a JSON Schema object")
 
+    def _dispatch_types(self) -> Union[List[tuple], None]:
+        # Per-branch python types when every branch declares a `type` and the
+        # declared types are pairwise disjoint, so at most one branch can
+        # match and the counter loop is unnecessary.
+        result = []
+        seen = set()
+        for schema in self.value:
+            if type(schema) != dict:
+                return None
+            t = schema.get("type")
+            if type(t) == str:
+                names = (t,)
+            elif type(t) == list and t:
+                names = tuple(t)
+            else:
+                return None
+            try:
+                types = tuple(Type.valid_types[name] for name in names)
+            except KeyError:
+                return None
+            if seen.intersection(types):
+                return None
+            seen.update(types)
+            result.append(types)
+        return result
+
+    def code_dispatch(self, dispatch: List[tuple]) -> str:
+        success = f"success_{id(self)}"
+        data_type = f"type_{id(self)}"
+
+        result = [f"{success} = 0", f"{data_type} = type({{data}})"]
+        if_stmt = "if"
+        for i, (schema, types) in enumerate(zip(self.value, dispatch)):
+            if type(None) in types:
+                self.import_module("extendedjsonschema.utils", "NoneType")
+            code = self.schema.program(schema, self.path + [i]).compile(error=f"{success} = 0")
+            condition = " or ".join(
+                f"{data_type} is {'NoneType' if t is type(None) else t.__name__}" for t in types
+            )
+            result.append(f"{if_stmt} {condition}:")
+            result.append(add_indent(f"# {i}"))
+            body = [f"{success} = 1"]
+            if code:
+                body.append(code)
+            result.append(add_indent("\n".join(body)))
+            if_stmt = "elif"
+        result.append(f"if {success} != 1:")
+        result.append(add_indent("{error}"))
+        return "\n".join(result)
+
     def compile(self) -> str:
-        programs = []
+        dispatch = self._dispatch_types()
+        if dispatch is not None:
+            return self.code_dispatch(dispatch)
+
         n_successes = f"n_successes_{id(self)}"
         success = f"success_{id(self)}"
 
-        for i, schema in enumerate(self.value):
-            code = self.schema.program(schema, self.path + [i]).compile(error=f"{success} = 0")
+        # Cheap branches first: once two succeed the remaining (expensive)
+        # branches are skipped by the n_successes guards below. The keyword
+        # reports a single error either way, so order is unobservable.
+        order = sorted(range(len(self.value)), key=lambda i: _schema_cost(self.value[i]))
+        programs = []
+        for i in order:
+            code = self.schema.program(self.value[i], self.path + [i]).compile(error=f"{success} = 0")
             programs.append(code)
             if not code:
                 logging.warning(f"Validation against subschema '{self.path + [i]}' is always true")
@@ -217,12 +420,19 @@ class Items(Keyword):
     type = "array"
 
     def validate(self):
-        if not self.schema.is_schema(self.value) and type(self.value) != list:
-            raise SchemaError(self.path, "It must be a JSON Schema object or an array")
         if type(self.value) == list:
             for i, item in enumerate(self.value):
                 if not self.schema.is_schema(item):
                     raise SchemaError(self.path + [i], "It must be a JSON Schema object")
+        elif not self.schema.is_schema(self.value):
+            raise SchemaError(self.path, "It must be a JSON Schema object or an array")
+
+    def errors(self, path: List[Union[int, str]]) -> dict:
+        result = super().errors(path)
+        additional = self.rules.get("additionalItems")
+        if additional is not None and additional.value is False and type(self.value) == list:
+            result["error_ai"] = {"path": path, "keyword": additional.name, "value": additional.value}
+        return result
 
     def code_list(self, program) -> str:
         i = f"i_{id(self)}"
@@ -236,19 +446,61 @@ for {i}, {data} in enumerate({{data}}):
         else:
             return ""
 
-    def code_tuple(self, programs: list) -> str:
+    def code_tuple(self) -> str:
         data_len = f"data_len_{id(self)}"
-        result = [f"{data_len} = len({{data}})"]
-        for i, p in enumerate(programs):
-            code = p.compile(data_path=Const(i))
-            if code:
-                result.append(f"if {data_len} > {i}:")
-                result.append(add_indent(code))
+        index = f"i_{id(self)}"
+        item = f"data_{id(self)}"
+
+        # Runs of identical adjacent schemas compile once and run as a single
+        # bounded loop instead of repeating the same code per position.
+        result = []
+        uses_len = False
+        i = 0
+        n = len(self.value)
+        while i < n:
+            j = i + 1
+            while j < n and self.value[j] == self.value[i]:
+                j += 1
+            program = self.schema.program(self.value[i], self.path + [i])
+            if j - i > 1:
+                code = program.compile(data=item, data_path=Variable(index))
+                if code:
+                    result.append(f"for {index}, {item} in enumerate({{data}}[{i}:{j}], {i}):")
+                    result.append(add_indent(code))
+            else:
+                code = program.compile(data_path=Const(i))
+                if code:
+                    result.append(f"if {data_len} > {i}:")
+                    result.append(add_indent(code))
+                    uses_len = True
+            i = j
+
+        # additionalItems covers the tail here, sharing data_len and the
+        # loop locals, instead of re-measuring the array in its own keyword
+        additional = self.rules.get("additionalItems")
+        if additional is not None and additional.value is not True:
+            if additional.value is False:
+                result.append(f"if {data_len} > {n}:")
+                result.append(add_indent(f"for {index} in range({n}, {data_len}):"))
+                result.append(add_indent("{error_ai}", 2))
+                uses_len = True
+            else:
+                code = self.schema.program(additional.value).compile(data=item, data_path=Variable(index))
+                if code:
+                    result.append(f"if {data_len} > {n}:")
+                    result.append(add_indent(f"for {index}, {item} in enumerate({{data}}[{n}:], {n}):"))
+                    result.append(add_indent(code, 2))
+                    uses_len = True
+                else:
+                    logging.warning(f"Validation against subschema '{additional.path}' is always true")
+
+        if uses_len:
+            result.insert(0, f"{data_len} = len({{data}})")
         return "\n".join(result)
 
     def compile(self) -> str:
         if type(self.value) == list:
-            return self.code_tuple([self.schema.program(item, self.path + [i]) for i, item in enumerate(self.value)])
+            return self.code_tuple()
         else:
             return self.code_list(self.schema.program(self.value))
 
@@ -286,7 +538,9 @@ if len({{data}}) > {items_tuple_programs}:
             if type(self.rules["items"].value) == dict:
                 return ""
             elif type(self.rules["items"].value) == list:
-                items_tuple_programs = len(self.rules["items"].value)
+                # the tail is validated inside Items.code_tuple, which
+                # already measures the array once
+                return ""
 
         if self.value is True:
             return ""
@@ -344,15 +598,34 @@ class UniqueItems(Keyword):
             raise SchemaError(self.path, "It must be a boolean")
 
     def compile(self) -> str:
-        if self.value:
-            self.import_module("extendedjsonschema.tools", "non_unique_items")
-            return f"""
-for i_{id(self)} in sorted(non_unique_items({{data}})):
-    {{error}}
-"""
-        else:
+        if not self.value:
             return ""
 
+        # Stream through the array with a set of (type, value) keys so the
+        # check stops at the first duplicate instead of scanning every pair.
+        # Unhashable items (lists, dicts) hash via their canonical key, which
+        # keeps the whole pass linear.
+        self.import_module("extendedjsonschema.tools", "canonical_key")
+        item = f"item_{id(self)}"
+        seen = f"seen_{id(self)}"
+        key = f"key_{id(self)}"
+        return f"""
+{seen} = set()
+for {item} in {{data}}:
+    {key} = (type({item}), {item})
+    try:
+        if {key} in {seen}:
+            {{error}}
+            break
+        {seen}.add({key})
+    except TypeError:
+        {key} = canonical_key({item})
+        if {key} in {seen}:
+            {{error}}
+            break
+        {seen}.add({key})
+"""
+
 
 # Number and Integer
 class MultipleOf(Keyword):
@@ -366,6 +639,23 @@ class MultipleOf(Keyword):
             raise SchemaError(self.path, "It must be strictly greater than 0")
 
     def compile(self) -> str:
+        # Power-of-two divisors: a bitmask test beats modulo for ints, but
+        # the same code lands in the float bucket too, so dispatch on type
+        if self.value == 1:
+            return f"""
+if type({{data}}) is float and {{data}} % 1 != 0:
+    {{error}}
+"""
+        elif self.value > 0 and self.value & (self.value - 1) == 0:
+            data_type = f"type_data_{id(self)}"
+            return f"""
+{data_type} = type({{data}})
+if {data_type} is int:
+    if {{data}} & {self.value - 1}:
+        {{error}}
+elif {{data}} % {self.value} != 0:
+    {{error}}
+"""
         return f"""
 if {{data}} % {self.value} != 0:
     {{error}}
@@ -393,7 +683,10 @@ if {{data}} < {self.value}:
 """
 
     def compile(self) -> str:
-        if "exclusiveMinimum" in self.rules and self.rules["exclusiveMinimum"].value is True:
+        if "maximum" in self.rules:
+            # Maximum emits a fused chained comparison for both bounds
+            return ""
+        elif "exclusiveMinimum" in self.rules and self.rules["exclusiveMinimum"].value is True:
             return self.code_strict()
         else:
             return self.code()
@@ -423,8 +716,34 @@ if {{data}} > {self.value}:
     {{error}}
 """
 
+    def errors(self, path: List[Union[int, str]]) -> dict:
+        result = super().errors(path)
+        minimum = self.rules.get("minimum")
+        if minimum is not None:
+            result["error_min"] = {"path": path, "keyword": minimum.name, "value": minimum.value}
+        return result
+
+    def code_range(self, low, low_op: str, high_op: str) -> str:
+        # both bounds in one chained comparison; the failing side is only
+        # sorted out on the error path
+        return f"""
+if not ({low} {low_op} {{data}} {high_op} {self.value}):
+    if not ({low} {low_op} {{data}}):
+        {{error_min}}
+    else:
+        {{error}}
+"""
+
+    def _exclusive(self, name: str) -> bool:
+        return name in self.rules and self.rules[name].value is True
+
     def compile(self) -> str:
-        if "exclusiveMaximum" in self.rules and self.rules["exclusiveMaximum"].value is True:
+        minimum = self.rules.get("minimum")
+        if minimum is not None:
+            low_op = "<" if self._exclusive("exclusiveMinimum") else "<="
+            high_op = "<" if self._exclusive("exclusiveMaximum") else "<="
+            return self.code_range(minimum.value, low_op, high_op)
+        elif self._exclusive("exclusiveMaximum"):
             return self.code_strict()
         else:
             return self.code()
@@ -464,7 +783,7 @@ class Properties(Keyword):
             raise SchemaError(self.path, "It must be an object")
         elif len(self.value.keys()) == 0:
             raise SchemaError(self.path, "It must be an object with at least one key-value pair")
-        elif len(list(filter(lambda x: type(x) != str or len(x) == 0, self.value.keys()))) > 0:
+        elif any(type(x) is not str or not x for x in self.value.keys()):
             raise SchemaError(self.path, "It must be an object, where each key is a non-empty string")
         else:
             for key, value in self.value.items():
@@ -472,15 +791,20 @@ class Properties(Keyword):
                     raise SchemaError(self.path + [key], "It must be a JSON Schema object")
 
     def compile(self) -> str:
+        # One .get per property replaces the membership probe plus every
+        # subsequent subscript; MISSING distinguishes absence from null.
+        self.import_module("extendedjsonschema.utils", "MISSING")
+        local = f"data_{id(self)}"
         programs = {}
         for prop, schema in self.value.items():
-            code = self.schema.program(schema, self.path + [prop]).compile(data_path=Const(prop))
+            code = self.schema.program(schema, self.path + [prop]).compile(data=local, data_path=Const(prop))
             if code:
                 programs[prop] = code
 
         result = []
         for prop, code in programs.items():
-            result.append(f"""if "{prop}" in {{data}}:""")
+            result.append(f"{local} = {{data}}.get({to_python_code(prop)}, MISSING)")
+            result.append(f"if {local} is not MISSING:")
             result.append(add_indent(code))
         return "\n".join(result)
 
@@ -489,6 +813,10 @@ class PatternProperties(Keyword):
     name = "patternProperties"
     type = "object"
 
+    # numeric (\1) or named ((?P=name)) backreferences; may overmatch an
+    # escaped backslash, which only costs the per-pattern fallback
+    re_backreference = re.compile(r"\\[1-9]|\(\?P=")
+
     def validate(self):
         if type(self.value) != dict:
             raise SchemaError(self.path, "It must be an object")
@@ -496,54 +824,147 @@ class PatternProperties(Keyword):
         if len(self.value.keys()) == 0:
             raise SchemaError(self.path, "It must be an object with at least one key-value pair")
 
-        if len(list(filter(lambda x: type(x) != str or len(x) == 0, self.value.keys()))) > 0:
+        if any(type(x) is not str or not x for x in self.value.keys()):
             raise SchemaError(self.path, "It must be an object, where each key is a non-empty string")
 
         for key, value in self.value.items():
             if not self.schema.is_schema(value):
                 raise SchemaError(self.path + [key], "It must be a JSON Schema object")
             try:
-                re.compile(key)
+                _compile_pattern(key)
             except re.error:
                 raise SchemaError(self.path, "It must be an object, where each key is a valid regular expression")
 
-    def code(self, codes: List[str]) -> str:
+    def errors(self, path: List[Union[int, str]]) -> dict:
+        result = super().errors(path)
+        additional = self.rules.get("additionalProperties")
+        if additional is not None and additional.value is False:
+            result["error_ap"] = {"path": path, "keyword": additional.name, "value": additional.value}
+        return result
+
+    def code(self, codes: List[str], additional: Union[str, None], properties: bool) -> str:
         prop = f"prop_{id(self)}"
         data = f"data_{id(self)}"
+        combined = f"combined_match_{id(self)}"
+        i = 2 if properties else 1
 
-        result = [f"for {prop}, {data} in {{data}}.items():"]
-        for i, code in enumerate(codes):
-            result.append(add_indent(f"if {{pattern_{i}}}.match({prop}):", 1))
-            result.append(add_indent(code, 2))
-
-        return "\n".join(result)
+        with_codes = [(j, code) for j, code in enumerate(codes) if code]
+        if not with_codes and not additional:
+            return ""
 
-    def code_with_properties(self, codes: List[str]) -> str:
+        # bind .match once per object instead of per key; the combined
+        # alternation answers "does any pattern match" in one C call
+        matchers = [f"{combined} = {{combined}}.match"]
+        result = []
+        if with_codes:
+            if len(codes) == 1:
+                inner = with_codes[0][1]
+            else:
+                lines = []
+                for j, code in with_codes:
+                    matchers.append(f"match_{j}_{id(self)} = {{pattern_{j}}}.match")
+                    lines.append(f"if match_{j}_{id(self)}({prop}):")
+                    lines.append(add_indent(code))
+                inner = "\n".join(lines)
+            result.append(add_indent(f"if {combined}({prop}):", i))
+            result.append(add_indent(inner, i + 1))
+            if additional:
+                result.append(add_indent("else:", i))
+                result.append(add_indent(additional, i + 1))
+        else:
+            result.append(add_indent(f"if not {combined}({prop}):", i))
+            result.append(add_indent(additional, i + 1))
+
+        out = matchers
+        out.append(f"for {prop}, {data} in {{data}}.items():")
+        if properties:
+            out.append(add_indent(f"if {prop} not in {{properties}}:"))
+        out.extend(result)
+        return "\n".join(out)
+
+    def code_per_pattern(self, codes: List[str], additional: Union[str, None], properties: bool) -> str:
+        # fallback when the patterns cannot share one compiled alternation
+        # (e.g. the same group name appears in two of them)
         prop = f"prop_{id(self)}"
         data = f"data_{id(self)}"
+        matched = f"pp_matched_{id(self)}"
+        i = 2 if properties else 1
+
+        branches = []
+        matchers = []
+        for j, code in enumerate(codes):
+            body = []
+            if additional:
+                body.append(f"{matched} = True")
+            if code:
+                body.append(code)
+            if body:
+                matchers.append(f"match_{j}_{id(self)} = {{pattern_{j}}}.match")
+                branches.append(add_indent(f"if match_{j}_{id(self)}({prop}):", i))
+                branches.append(add_indent("\n".join(body), i + 1))
+
+        if not branches and not additional:
+            return ""
 
-        result = [f"for {prop}, {data} in {{data}}.items():"]
-        for i, code in enumerate(codes):
+        result = matchers
+        result.append(f"for {prop}, {data} in {{data}}.items():")
+        if properties:
             result.append(add_indent(f"if {prop} not in {{properties}}:"))
-            result.append(add_indent(f"if {{pattern_{i}}}.match({prop}):", 2))
-            result.append(add_indent(code, 3))
+        if additional:
+            result.append(add_indent(f"{matched} = False", i))
+        result.extend(branches)
+        if additional:
+            result.append(add_indent(f"if not {matched}:", i))
+            result.append(add_indent(additional, i + 1))
 
         return "\n".join(result)
 
+    def _additional_code(self) -> Union[str, None]:
+        # A sibling additionalProperties fuses into this keyword's loop as
+        # the branch for keys no pattern matched; one pass over the object
+        # instead of two.
+        additional = self.rules.get("additionalProperties")
+        if additional is None or additional.value is True:
+            return None
+        elif additional.value is False:
+            return "{error_ap}"
+        else:
+            code = self.schema.program(additional.value).compile(
+                data=f"data_{id(self)}", data_path=Variable(f"prop_{id(self)}")
+            )
+            return code or None
+
     def compile(self) -> str:
         self.import_package("re")
 
+        patterns = list(self.value.keys())
         programs = []
-        for i, pattern in enumerate(self.value.keys()):
-            self.set_variable(f"pattern_{i}", re.compile(pattern))
+        for i, pattern in enumerate(patterns):
+            self.set_variable(f"pattern_{i}", _compile_pattern(pattern))
             program = self.schema.program(self.value[pattern], self.path + [pattern])
             programs.append(program.compile(data=f"data_{id(self)}", data_path=Variable(f"prop_{id(self)}")))
 
-        if "properties" in self.rules:
+        properties = "properties" in self.rules
+        if properties:
             self.set_variable("properties", set(self.rules["properties"].value.keys()))
-            return self.code_with_properties(programs)
+        additional = self._additional_code()
+
+        if len(patterns) == 1:
+            combined = _compile_pattern(patterns[0])
+        elif any(self.re_backreference.search(pattern) for pattern in patterns):
+            # joining renumbers capture groups, so a backreference in any
+            # pattern would silently point at the wrong group — the combined
+            # pattern still compiles, only its matches are wrong
+            combined = None
         else:
-            return self.code(programs)
+            try:
+                combined = _compile_pattern("|".join(f"(?:{pattern})" for pattern in patterns))
+            except re.error:
+                combined = None
+        if combined is None:
+            return self.code_per_pattern(programs, additional, properties)
+        self.set_variable("combined", combined)
+        return self.code(programs, additional, properties)
 
 
 class AdditionalProperties(Keyword):
@@ -555,16 +976,10 @@ class AdditionalProperties(Keyword):
             raise SchemaError(self.path, "It must be a boolean or a JSON Schema object")
 
     def code_false(self) -> str:
+        # set difference runs at C level; the loop only visits extra keys
         return f"""
-for prop_{id(self)} in {{data}}.keys():
-    if prop_{id(self)} in {{properties}}:
-        continue
-
-    for pp_{id(self)} in {{pattern_properties}}:
-        if pp_{id(self)}.match(prop_{id(self)}):
-            break
-    else:
-        {{error}}
+for prop_{id(self)} in {{data}}.keys() - {{properties}}:
+    {{error}}
 """
 
     def code(self, code: str) -> str:
@@ -579,94 +994,68 @@ for prop_{id(self)}, data_{id(self)} in {{data}}.items():
 for {prop}, data_{id(self)} in {{data}}.items():
     if {prop} not in {{properties}}:
 {add_indent(code, 2)}
-"""
-
-    def code_with_pp(self, code: str) -> str:
-        prop = f"prop_{id(self)}"
-        pattern = f"pattern_{id(self)}"
-        return f"""
-for {prop}, data_{id(self)} in {{data}}.items():
-    for {pattern} in {{pattern_properties}}:
-        if {pattern}.match({prop}):
-            break
-    else:
-{add_indent(code, 2)}
-"""
-
-    def code_with_properties_and_pp(self, code: str) -> str:
-        prop = f"prop_{id(self)}"
-        pattern = f"pattern_{id(self)}"
-        return f"""
-for {prop}, data_{id(self)} in {{data}}.items():
-    if {prop} not in {{properties}}:
-        for {pattern} in {{pattern_properties}}:
-            if {pattern}.match({prop}):
-                break
-        else:
-{add_indent(code, 3)}
 """
 
     def compile(self) -> str:
-        properties = set()
-        pattern_properties = []
-
         if self.value is True:
             return ""
-        else:
-            if "properties" in self.rules:
-                properties = set(self.rules["properties"].value.keys())
+        elif "patternProperties" in self.rules:
+            # The patternProperties loop already dispatches unmatched keys to
+            # this keyword, so a second pass over the object is not needed.
+            return ""
+
+        properties = set()
+        if "properties" in self.rules:
+            properties = set(self.rules["properties"].value.keys())
 
-            if "patternProperties" in self.rules:
-                for regexp_property in self.rules["patternProperties"].value.keys():
-                    pattern_properties.append(re.compile(regexp_property))
+        if self.value is False:
+            self.set_variable("properties", properties)
+            return self.code_false()
 
-            if self.value is False:
-                self.set_variable("properties", properties)
-                self.set_variable("pattern_properties", pattern_properties)
-                return self.code_false()
-            else:
-                code = self.schema.program(self.value).compile(
-                    data=f"data_{id(self)}", data_path=Variable(f"prop_{id(self)}")
-                )
-                if not code:
-                    return ""
-
-            if properties and pattern_properties:
-                self.set_variable("properties", properties)
-                self.set_variable("pattern_properties", pattern_properties)
-                return self.code_with_properties_and_pp(code)
-            elif properties:
-                self.set_variable("properties", properties)
-                return self.code_with_properties(code)
-            elif pattern_properties:
-                self.set_variable("pattern_properties", pattern_properties)
-                return self.code_with_pp(code)
-            else:
-                return self.code(code)
+        code = self.schema.program(self.value).compile(
+            data=f"data_{id(self)}", data_path=Variable(f"prop_{id(self)}")
+        )
+        if not code:
+            return ""
+
+        if properties:
+            self.set_variable("properties", properties)
+            return self.code_with_properties(code)
+        else:
+            return self.code(code)
 
 
 class Required(Keyword):
     name = "required"
     type = "object"
+    max_unrolled = 20
 
     def validate(self):
         if type(self.value) != list:
             raise SchemaError(self.path, "It must be an array")
-        elif len(list(filter(lambda x: type(x) != str or len(x) == 0, self.value))) > 0:
+        elif any(type(x) is not str or not x for x in self.value):
             raise SchemaError(self.path, "It must be an array, where each element is a non-empty string")
-        elif len(self.value) != len(set(self.value)):
+        elif has_duplicates(self.value):
             raise SchemaError(self.path, "It must be an array of strings, where each element is unique")
 
     def compile(self) -> str:
-        if self.value:
+        if not self.value:
+            return ""
+        elif len(self.value) <= self.max_unrolled:
+            # straight-line membership tests, one per field (ajv-style
+            # unrolling); keeps one error per missing field like the loop
+            result = []
+            for field in self.value:
+                result.append(f"if {to_python_code(field)} not in {{data}}:")
+                result.append(add_indent("{error}"))
+            return "\n".join(result)
+        else:
             self.set_variable("value", self.value)
             return f"""
 for field_{id(self)} in {{value}}:
     if field_{id(self)} not in {{data}}:
         {{error}}
 """
-        else:
-            return ""
 
 
 class MinProperties(Keyword):
@@ -684,7 +1073,7 @@ class MinProperties(Keyword):
             return ""
         else:
             return f"""
-if len({{data}}.keys()) < {self.value}:
+if len({{data}}) < {self.value}:
     {{error}}
 """
 
@@ -705,7 +1094,7 @@ class MaxProperties(Keyword):
 
     def compile(self) -> str:
         return f"""
-if len({{data}}.keys()) > {self.value}:
+if len({{data}}) > {self.value}:
     {{error}}
 """
 
@@ -719,12 +1108,12 @@ class Dependencies(Keyword):
             raise SchemaError(self.path, "It must be an object")
         elif len(self.value.keys()) == 0:
             raise SchemaError(self.path, "It must be an object with at least one key-value pair")
-        elif len(list(filter(lambda x: type(x) != str or len(x) == 0, self.value.keys()))) > 0:
+        elif any(type(x) is not str or not x for x in self.value.keys()):
             raise SchemaError(self.path, "It must be an object, where each key is a non-empty string")
         else:
             for key, value in self.value.items():
                 if type(value) == list:
-                    if len(list(filter(lambda x: type(x) != str or len(x) == 0, value))) > 0:
+                    if any(type(x) is not str or not x for x in value):
                         raise SchemaError(
                             self.path + [key], "It must be an array, where each element is a non-empty string"
                         )
@@ -805,7 +1194,7 @@ class MaxLength(Keyword):
 
     def code(self) -> str:
         return f"""
-if len(value) > {self.value}:
+if len({{data}}) > {self.value}:
     {{error}}
 """
 
@@ -819,13 +1208,13 @@ class Pattern(Keyword):
 
     def validate(self):
         try:
-            re.compile(self.value)
+            _compile_pattern(self.value)
         except re.error:
             raise SchemaError(self.path, "Invalid regular expression")
 
     def compile(self) -> str:
         self.import_package("re")
-        self.set_variable("pattern", re.compile(self.value))
+        self.set_variable("pattern", _compile_pattern(self.value))
         return f"""
 if not {{pattern}}.match({{data}}):
     {{error}}
@@ -837,14 +1226,55 @@ class Format(Keyword):
     type = "string"
     valid_formats = {"date-time", "email", "hostname", "ipv4", "ipv6", "uri"}
 
+    # compiled once at import: thousands of properties sharing a format
+    # should not recompile the same patterns per schema. (?a) keeps \d on
+    # the ASCII engine — and rejects Unicode digits, which RFC 3339 and
+    # dotted-quad addresses do not allow. The inline flag (rather than
+    # re.ASCII) survives the pattern-text round-trip in to_python_code.
+    re_datetime = re.compile(r"(?a)^\d{4}-[01]\d-[0-3]\d(t|T)[0-2]\d:[0-5]\d:[0-5]\d(?:\.\d+)?(?:[+-][0-2]\d:[0-5]\d|[+-][0-2]\d[0-5]\d|z|Z)\Z")
+    re_bad_email_name = re.compile(r"(^[^a-zA-Z0-9]){1}|([^a-zA-Z0-9._+-])+|([._\-+]{2,})|([^a-zA-Z0-9]$){1}")
+    re_bad_email_domain = re.compile(r"(^[^a-zA-Z0-9]){1}|([^a-zA-Z0-9.-]+)|([.-]{2,})|([a-zA-Z0-9-]){65,}|([^a-zA-Z0-9.]$){1}")
+    re_bad_hostname = re.compile(r"(^[^a-zA-Z0-9]){1}|([^a-zA-Z0-9.-]+)|([.-]{2,})|([a-zA-Z0-9-]){65,}|([^a-zA-Z0-9.]$){1}")
+    re_bad_uri_scheme = re.compile(r"(^[^a-zA-Z]){1}|([^a-zA-Z0-9.+-])+")
+    re_ipv4 = re.compile(r"(?a)^(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)(\.(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)){3}\Z")
+    re_ipv6 = re.compile(
+        r"^(([0-9a-fA-F]{1,4}:){7}[0-9a-fA-F]{1,4}"
+        r"|([0-9a-fA-F]{1,4}:){1,7}:"
+        r"|([0-9a-fA-F]{1,4}:){1,6}:[0-9a-fA-F]{1,4}"
+        r"|([0-9a-fA-F]{1,4}:){1,5}(:[0-9a-fA-F]{1,4}){1,2}"
+        r"|([0-9a-fA-F]{1,4}:){1,4}(:[0-9a-fA-F]{1,4}){1,3}"
+        r"|([0-9a-fA-F]{1,4}:){1,3}(:[0-9a-fA-F]{1,4}){1,4}"
+        r"|([0-9a-fA-F]{1,4}:){1,2}(:[0-9a-fA-F]{1,4}){1,5}"
+        r"|[0-9a-fA-F]{1,4}:(:[0-9a-fA-F]{1,4}){1,6}"
+        r"|:((:[0-9a-fA-F]{1,4}){1,7}|:))\Z"
+    )
+
     def validate(self):
         if self.value not in self.valid_formats:
             raise SchemaError(self.path, f"Invalid format: {self.value}")
 
     def _code_datetime(self) -> str:
+        # the shortest valid date-time is "YYYY-MM-DDThh:mm:ssZ" — 20
+        # characters — so a length test rejects most malformed inputs
+        # before the regex engine is entered
+        if sys.version_info < (3, 11):
+            return """
+if len({data}) < 20 or not {datetime}.match({data}):
+    {error}
+"""
+        # the regex pins down the RFC 3339 shape (T/t separator, dot
+        # fraction, mandatory offset) — fromisoformat alone also accepts
+        # week dates, comma fractions and arbitrary separators; it is kept
+        # only to reject the impossible calendar dates the regex lets
+        # through, and its offset requirement is already proven by the regex
         return """
-if not {datetime}.match({value}):
+if len({data}) < 20 or not {datetime}.match({data}):
     {error}
+else:
+    try:
+        datetime.fromisoformat({data}.replace("z", "+00:00").replace("Z", "+00:00"))
+    except ValueError:
+        {error}
 """
 
     def _code_email(self) -> str:
@@ -852,7 +1282,7 @@ if not {datetime}.match({value}):
         domain = f"domain_{id(self)}"
         return f"""
 try:
-    {name}, {domain} = {{value}}.split("@", 1)
+    {name}, {domain} = {{data}}.split("@", 1)
     if not {name} or not {domain} or {{bad_email_name}}.match({name}) or {{bad_email_domain}}.match({domain}):
         {{error}}
 except ValueError:
@@ -861,54 +1291,20 @@ except ValueError:
 
     def _code_hostname(self) -> str:
         return """
-if not {value} or {bad_hostname}.match({value}):
+if not {data} or {bad_hostname}.match({data}):
     {error}
 """
 
     def _code_ipv4(self) -> str:
-        parts = f"parts_{id(self)}"
-        part = f"part_{id(self)}"
-        return f"""
-{parts} = {{value}}.split(".")
-
-if len({parts}) == 4:
-    for {part} in {parts}:
-        try:
-            if len({part}) == 0 or ({part}[0] == "0" and len({part}) > 1) or not (-1 < int({part}) < 256):
-                {{error}}
-                break
-        except ValueError:
-            {{error}}
-            break
-else:
-    {{error}}
+        return """
+if not {ipv4}.match({data}):
+    {error}
 """
 
     def _code_ipv6(self) -> str:
-        parts = f"parts_{id(self)}"
-        part = f"part_{id(self)}"
-        empty_parts = f"empty_parts_{id(self)}"
-        return f"""
-{parts} = {{value}}.split(":")
-
-if len({parts}) < 9:
-    {empty_parts} = 0
-    for {part} in {parts}:
-        if not {part}:
-            {empty_parts} += 1
-            continue
-        try:
-            if (len({part}) > 1 and {part}[0] == "0") or not (-1 < int({part}, 16) < 65536):
-                {{error}}
-                break
-        except ValueError:
-            {{error}}
-            break
-
-    if {empty_parts} > 3 or {empty_parts} > 1 and len({parts}) > 4:
-        {{error}}
-else:
-    {{error}}
+        return """
+if not {ipv6}.match({data}):
+    {error}
 """
 
     def _code_uri(self) -> str:
@@ -916,7 +1312,7 @@ else:
         hier_part = f"hier_part_{id(self)}"
         return f"""
 try:
-    {scheme}, {hier_part} = {{value}}.split(":", 1)
+    {scheme}, {hier_part} = {{data}}.split(":", 1)
     if {scheme} and {hier_part} and not {{bad_uri_scheme}}.match({scheme}):
         # Authority part
         if {hier_part}.startswith("//"):
@@ -932,36 +1328,30 @@ except ValueError:
     def compile(self) -> str:
         if self.value == "date-time":
             self.import_package("re")
-            self.set_variable(
-                "datetime",
-                re.compile(r"^\d{4}-[01]\d-[0-3]\d(t|T)[0-2]\d:[0-5]\d:[0-5]\d(?:\.\d+)?(?:[+-][0-2]\d:[0-5]\d|[+-][0-2]\d[0-5]\d|z|Z)\Z")
-            )
+            self.set_variable("datetime", self.re_datetime)
+            if sys.version_info >= (3, 11):
+                self.import_module("datetime", "datetime")
             return self._code_datetime()
         elif self.value == "email":
             self.import_package("re")
-            self.set_variable(
-                "bad_email_name",
-                re.compile(r"(^[^a-zA-Z0-9]){1}|([^a-zA-Z0-9._+-])+|([._\-+]{2,})|([^a-zA-Z0-9]$){1}")
-            )
-            self.set_variable(
-                "bad_email_domain",
-                re.compile(r"(^[^a-zA-Z0-9]){1}|([^a-zA-Z0-9.-]+)|([.-]{2,})|([a-zA-Z0-9-]){65,}|([^a-zA-Z0-9.]$){1}")
-            )
+            self.set_variable("bad_email_name", self.re_bad_email_name)
+            self.set_variable("bad_email_domain", self.re_bad_email_domain)
             return self._code_email()
         elif self.value == "hostname":
             self.import_package("re")
-            self.set_variable(
-                "bad_hostname",
-                re.compile(r"(^[^a-zA-Z0-9]){1}|([^a-zA-Z0-9.-]+)|([.-]{2,})|([a-zA-Z0-9-]){65,}|([^a-zA-Z0-9.]$){1}")
-            )
+            self.set_variable("bad_hostname", self.re_bad_hostname)
             return self._code_hostname()
         elif self.value == "ipv4":
+            self.import_package("re")
+            self.set_variable("ipv4", self.re_ipv4)
             return self._code_ipv4()
         elif self.value == "ipv6":
+            self.import_package("re")
+            self.set_variable("ipv6", self.re_ipv6)
             return self._code_ipv6()
         elif self.value == "uri":
             self.import_package("re")
-            self.set_variable("bad_uri_scheme", re.compile(r"(^[^a-zA-Z]){1}|([^a-zA-Z0-9.+-])+"))
+            self.set_variable("bad_uri_scheme", self.re_bad_uri_scheme)
             return self._code_uri()
         else:
             SchemaError(self.path, f"Invalid format: {self.value}")
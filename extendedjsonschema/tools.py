@@ -1,25 +1,32 @@
 import re
+import textwrap
 
 from collections.abc import Iterable
+from functools import lru_cache
 from typing import Any, Union
 
 from extendedjsonschema.errors import CompilerError
 
 
 class DataIndex:
+    __slots__ = ("value", "_rendered")
+
     def __init__(self, value: Union[int, str]):
         self.value = value
+        # rendered python code, filled lazily by to_python_code: the same
+        # index object is serialized once per keyword that references it
+        self._rendered = None
 
     def __repr__(self):
         return f"{self.__class__.__name__}(value={self.value})"
 
 
 class Const(DataIndex):
-    pass
+    __slots__ = ()
 
 
 class Variable(DataIndex):
-    pass
+    __slots__ = ()
 
 
 def is_equal(t1, t2, data1, data2):
@@ -65,19 +72,62 @@ def non_unique_items(value: list) -> set:
     return result
 
 
+def canonical_key(value: Any) -> tuple:
+    # hashable, type-strict stand-in for a JSON value: equal keys exactly
+    # when is_equal would consider the values equal
+    t = type(value)
+    if t is list:
+        return list, tuple(canonical_key(item) for item in value)
+    elif t is dict:
+        return dict, tuple(sorted((k, canonical_key(v)) for k, v in value.items()))
+    else:
+        return t, value
+
+
+def has_duplicates(items: Iterable) -> bool:
+    seen = set()
+    add = seen.add
+    return any(item in seen or add(item) for item in items)
+
+
 def add_indent(code: str, i: int = 1) -> str:
-    result = []
     if i < 0:
         i = 0
-    s = "    " * i
-    for line in code.split("\n"):
-        result.append(f"{s}{line}")
-    return "\n".join(result)
+    return textwrap.indent(code, "    " * i, lambda line: True)
+
+
+_LITERAL_TYPES = {bool, int, float, str, type(None)}
+
+
+def _is_pure_literal(value: Any) -> bool:
+    value_type = type(value)
+    if value_type in _LITERAL_TYPES:
+        return True
+    elif value_type in {list, tuple, set}:
+        return all(_is_pure_literal(item) for item in value)
+    elif value_type == dict:
+        return all(_is_pure_literal(k) and _is_pure_literal(v) for k, v in value.items())
+    else:
+        return False
+
+
+@lru_cache(maxsize=4096)
+def _repr_str(value: str) -> str:
+    return repr(value)
 
 
 def to_python_code(value: Any) -> str:
     value_type = type(value)
-    if value_type in {list, tuple, set}:
+    if value_type is str:
+        # repr scans the string for escapes; schemas repeat the same
+        # property names and patterns many times, so memoize the result
+        return _repr_str(value)
+    elif value_type in _LITERAL_TYPES:
+        # repr of a literal is already valid Python source and is built in C
+        return repr(value)
+    elif value_type in {list, tuple, set, dict} and _is_pure_literal(value):
+        return repr(value)
+    elif value_type in {list, tuple, set}:
         brackets = {list: ("[", "]"), tuple: ("(", ")"), set: ("{", "}")}
         result = []
         for item in value:
@@ -89,18 +139,17 @@ def to_python_code(value: Any) -> str:
             result.append(f"{to_python_code(k)}: {to_python_code(v)}")
         result = ", ".join(result)
         return f"{{{result}}}"
-    elif value_type in {bool, int, float, type(None)}:
-        return str(value)
-    elif value_type == str:
-        return f'"{value}"'
     elif isinstance(value, type):
         return value.__name__
     elif isinstance(value, Iterable):
         return to_python_code(list(value))
     elif isinstance(value, re.Pattern):
-        return str(value)
+        # str(pattern) truncates long patterns; rebuild the compile call
+        return f"re.compile({_repr_str(value.pattern)})"
     elif isinstance(value, Const):
-        return to_python_code(value.value)
+        if value._rendered is None:
+            value._rendered = to_python_code(value.value)
+        return value._rendered
     elif isinstance(value, Variable):
         return value.value
     else:
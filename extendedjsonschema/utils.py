@@ -1,5 +1,11 @@
 from typing import Callable, List, Union
 
+NoneType = type(None)
+
+# sentinel for dict.get in generated code: any JSON value, including null,
+# must compare unequal to it
+MISSING = object()
+
 ERRORS = List[dict]
 JSON = Union[bool, int, float, str, list, dict, None]
 PATH = List[Union[str, int]]
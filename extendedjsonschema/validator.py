@@ -1,4 +1,7 @@
-from typing import Callable
+import ast
+import json
+from types import CodeType
+from typing import Callable, Dict
 
 from extendedjsonschema.errors import SchemaError
 from extendedjsonschema.schema import Schema
@@ -11,17 +14,35 @@ except ModuleNotFoundError:
     CYTHON = False
 
 
+_MODULE_CACHE: Dict[str, ast.Module] = {}
+_CODE_CACHE: Dict[str, CodeType] = {}
+
+
 class Validator:
     def __init__(self, schema_definition: dict):
         self._schemas = {
             "http://json-schema.org/schema#": SchemaDraft04,
             "http://json-schema.org/draft-04/schema#": SchemaDraft04
         }
-        schema = self._schema(schema_definition.get("$schema", "http://json-schema.org/draft-04/schema#"))
-        program = schema.program(schema_definition)
-        self.source_code = program.compile(False)
+        try:
+            cache_key = json.dumps(schema_definition, sort_keys=True)
+        except (TypeError, ValueError):
+            cache_key = None
+        self._cache_key = cache_key
+        if cache_key is not None and cache_key in _MODULE_CACHE:
+            self._module = _MODULE_CACHE[cache_key]
+        else:
+            schema = self._schema(schema_definition.get("$schema", "http://json-schema.org/draft-04/schema#"))
+            program = schema.program(schema_definition)
+            self._module = program.compile_ast()
+            if cache_key is not None:
+                _MODULE_CACHE[cache_key] = self._module
         self.run = self._function()
 
+    @property
+    def source_code(self) -> str:
+        return ast.unparse(self._module)
+
     def _schema(self, dialect: str) -> Schema:
         try:
             return self._schemas[dialect]()
@@ -32,8 +53,13 @@ class Validator:
         if CYTHON:
             return cython.inline(self.source_code, language_level=3, quiet=True)["program"]
         else:
+            code = _CODE_CACHE.get(self._cache_key) if self._cache_key is not None else None
+            if code is None:
+                code = compile(self._module, "<extendedjsonschema>", "exec", optimize=2)
+                if self._cache_key is not None:
+                    _CODE_CACHE[self._cache_key] = code
             state = {}
-            exec(self.source_code, state)
+            exec(code, state)
             return state["program"]
 
     def __repr__(self):